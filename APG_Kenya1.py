@@ -1,19 +1,227 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
+
+# Serialize figures with the orjson C extension rather than the stdlib encoder
+pio.json.config.default_engine = "orjson"
 
 # ======================
 # Helper Functions
 # ======================
 
 def calc_costs(value, rate, duration_years):
-    """Calculate annual and total costs based on value, bank rate and duration."""
+    """Calculate annual and total costs based on value, bank rate and duration.
+
+    Works element-wise on NumPy arrays as well as scalars, so a whole sweep
+    of values, rates or durations is evaluated in one broadcast pass.
+    """
     annual = value * rate
     total = annual * duration_years
     return annual, total
 
-def format_currency(num):
-    return f"${num:,.0f}"
+# Bound str.format method: no Python wrapper frame per formatted cell
+format_currency = "${:,.0f}".format
+
+@st.cache_data
+def compute_all(total_contract_value, advance_payment_percent_orig, pg_percent_orig,
+                construction_duration_orig, dlp_duration_orig, num_phases,
+                pg_percent_phased, construction_duration_phased, dlp_duration_phased,
+                bank_fee_rate):
+    """Derive every value, cost, saving and the summary table from the inputs.
+
+    Cached on the input tuple so reruns with previously seen parameters skip
+    the arithmetic and DataFrame construction entirely.
+    """
+    # Values
+    apg_value_orig = total_contract_value * advance_payment_percent_orig
+    pg_value_orig = total_contract_value * pg_percent_orig
+
+    phase_contract_value = total_contract_value / num_phases
+    apg_value_phased = phase_contract_value * advance_payment_percent_orig
+    pg_value_phased = phase_contract_value * pg_percent_phased
+
+    # Durations (years)
+    apg_duration_orig = construction_duration_orig / 12
+    pg_duration_orig = (construction_duration_orig + dlp_duration_orig) / 12
+    apg_duration_phased = construction_duration_phased / 12
+    pg_duration_phased = (construction_duration_phased + dlp_duration_phased) / 12
+
+    # Costs
+    apg_annual_cost_orig, apg_total_cost_orig = calc_costs(apg_value_orig, bank_fee_rate, apg_duration_orig)
+    pg_annual_cost_orig, pg_total_cost_orig = calc_costs(pg_value_orig, bank_fee_rate, pg_duration_orig)
+    total_cost_orig = apg_total_cost_orig + pg_total_cost_orig
+
+    apg_annual_cost_phased = apg_value_phased * bank_fee_rate
+    pg_annual_cost_phased = pg_value_phased * bank_fee_rate
+
+    # Phase values times num_phases add back up to the whole-contract values,
+    # so the phased totals are computed without a per-phase cost step
+    apg_total_cost_phased = apg_value_orig * bank_fee_rate * apg_duration_phased
+    pg_total_cost_phased = total_contract_value * pg_percent_phased * bank_fee_rate * pg_duration_phased
+    total_cost_phased = apg_total_cost_phased + pg_total_cost_phased
+
+    # Savings
+    apg_savings = apg_total_cost_orig - apg_total_cost_phased
+    pg_savings = pg_total_cost_orig - pg_total_cost_phased
+    total_savings = total_cost_orig - total_cost_phased
+
+    # Credit line
+    credit_line_orig = apg_value_orig
+    credit_line_phased = apg_value_phased + pg_value_phased
+    credit_line_savings = credit_line_orig - credit_line_phased
+
+    # Summary table: assemble the numbers once, then format whole columns
+    metrics = pd.Index([
+        "APG Value",
+        "PG Value",
+        "APG Duration (years)",
+        "PG Duration (years)",
+        "APG Annual Cost",
+        "PG Annual Cost",
+        "APG Total Cost",
+        "PG Total Cost",
+        "Total Cost",
+        "Credit Line Required"
+    ], name="Metric")
+    numeric = pd.DataFrame({
+        "Original Structure": [
+            apg_value_orig, pg_value_orig, apg_duration_orig, pg_duration_orig,
+            apg_annual_cost_orig, pg_annual_cost_orig,
+            apg_total_cost_orig, pg_total_cost_orig, total_cost_orig, credit_line_orig
+        ],
+        "Phased Structure": [
+            apg_value_phased, pg_value_phased, apg_duration_phased, pg_duration_phased,
+            apg_annual_cost_phased, pg_annual_cost_phased,
+            apg_total_cost_phased, pg_total_cost_phased, total_cost_phased, credit_line_phased
+        ],
+        "Savings/Improvement": [
+            0.0, 0.0, 0.0, 0.0, 0.0, 0.0,
+            apg_savings, pg_savings, total_savings, credit_line_savings
+        ]
+    }, index=metrics)
+
+    per_phase_rows = metrics[:6]
+    duration_rows = ["APG Duration (years)", "PG Duration (years)"]
+    formatted = numeric.map(format_currency)
+    formatted.loc[duration_rows] = numeric.loc[duration_rows].map("{:.1f}".format)
+    formatted.loc[per_phase_rows, "Phased Structure"] += " per phase"
+    formatted.loc["Credit Line Required", "Phased Structure"] += " at any time"
+    formatted.loc[per_phase_rows, "Savings/Improvement"] = ""
+    formatted.loc["Credit Line Required", "Savings/Improvement"] += " freed"
+    summary_df = formatted.reset_index()
+
+    return {
+        "apg_value_orig": apg_value_orig,
+        "pg_value_orig": pg_value_orig,
+        "phase_contract_value": phase_contract_value,
+        "apg_value_phased": apg_value_phased,
+        "pg_value_phased": pg_value_phased,
+        "apg_duration_orig": apg_duration_orig,
+        "pg_duration_orig": pg_duration_orig,
+        "apg_duration_phased": apg_duration_phased,
+        "pg_duration_phased": pg_duration_phased,
+        "apg_annual_cost_orig": apg_annual_cost_orig,
+        "apg_total_cost_orig": apg_total_cost_orig,
+        "pg_annual_cost_orig": pg_annual_cost_orig,
+        "pg_total_cost_orig": pg_total_cost_orig,
+        "total_cost_orig": total_cost_orig,
+        "apg_annual_cost_phased": apg_annual_cost_phased,
+        "pg_annual_cost_phased": pg_annual_cost_phased,
+        "apg_total_cost_phased": apg_total_cost_phased,
+        "pg_total_cost_phased": pg_total_cost_phased,
+        "total_cost_phased": total_cost_phased,
+        "apg_savings": apg_savings,
+        "pg_savings": pg_savings,
+        "total_savings": total_savings,
+        "credit_line_orig": credit_line_orig,
+        "credit_line_phased": credit_line_phased,
+        "credit_line_savings": credit_line_savings,
+        "summary_df": summary_df,
+    }
+
+
+@st.cache_data
+def build_csv(summary_df):
+    """Encode the Metric-indexed summary table as UTF-8 CSV bytes for download."""
+    return summary_df.to_csv().encode('utf-8')
+
+@st.cache_data
+def comparison_fig_json(cost_values, savings_values, credit_values):
+    """Cost, savings and credit-line bar charts as one subplot figure, in Plotly JSON."""
+    apg_orig, pg_orig, total_orig, apg_phased, pg_phased, total_phased = cost_values
+    cost_types = ["APG", "PG", "Total"]
+    fig = make_subplots(rows=1, cols=3, subplot_titles=(
+        "Cost Comparison: Original vs Phased", "Savings from Phased Structure", "Credit Line Requirements"))
+
+    # Cost comparison
+    fig.add_trace(go.Bar(name="Original Structure", x=cost_types,
+                         y=np.array([apg_orig, pg_orig, total_orig], dtype=np.float64)), 1, 1)
+    fig.add_trace(go.Bar(name="Phased Structure", x=cost_types,
+                         y=np.array([apg_phased, pg_phased, total_phased], dtype=np.float64)), 1, 1)
+    fig.update_xaxes(title_text="Cost Type", row=1, col=1)
+    fig.update_yaxes(title_text="Cost", row=1, col=1)
+
+    # Savings chart
+    fig.add_trace(go.Bar(x=["APG Savings", "PG Savings", "Total Savings"],
+                         y=np.asarray(savings_values, dtype=np.float64), showlegend=False), 1, 2)
+    fig.update_xaxes(title_text="Savings Type", row=1, col=2)
+    fig.update_yaxes(title_text="Amount", row=1, col=2)
+
+    # Credit line
+    fig.add_trace(go.Bar(x=["Original", "Phased"],
+                         y=np.asarray(credit_values, dtype=np.float64), showlegend=False), 1, 3)
+    fig.update_xaxes(title_text="Structure", row=1, col=3)
+    fig.update_yaxes(title_text="Credit Line Required", row=1, col=3)
+
+    fig.update_layout(barmode="group", legend_title="Structure")
+    return fig.to_json()
+
+@st.cache_data
+def rate_sweep_fig_json(apg_value_orig, pg_value_orig, pg_value_all_phases,
+                        apg_duration_orig, pg_duration_orig, apg_duration_phased, pg_duration_phased):
+    """Line chart of total cost for both structures across bank fee rates, as Plotly JSON."""
+    rates = np.linspace(0.001, 0.1, 100)
+    # One row per guarantee: original APG, original PG, phased APG, phased PG
+    values = np.array([apg_value_orig, pg_value_orig, apg_value_orig, pg_value_all_phases])[:, np.newaxis]
+    years = np.array([apg_duration_orig, pg_duration_orig, apg_duration_phased, pg_duration_phased])[:, np.newaxis]
+    _, totals = calc_costs(values, rates, years)
+    fig = go.Figure([
+        go.Scatter(name="Original Structure", x=rates * 100, y=totals[0] + totals[1], mode="lines"),
+        go.Scatter(name="Phased Structure", x=rates * 100, y=totals[2] + totals[3], mode="lines")
+    ])
+    fig.update_layout(title="Total Cost vs Bank Fee Rate", xaxis_title="Bank Fee Rate (% annually)",
+                      yaxis_title="Total Cost", legend_title="Structure")
+    return fig.to_json()
+
+@st.cache_data
+def build_detail_markdown(total_contract_value, advance_payment_percent_orig, pg_percent_orig,
+                          construction_duration_orig, dlp_duration_orig, num_phases,
+                          pg_percent_phased, construction_duration_phased, dlp_duration_phased,
+                          bank_fee_rate):
+    """Return the (original, phased) step-by-step working as markdown strings."""
+    results = compute_all(total_contract_value, advance_payment_percent_orig, pg_percent_orig,
+                          construction_duration_orig, dlp_duration_orig, num_phases,
+                          pg_percent_phased, construction_duration_phased, dlp_duration_phased,
+                          bank_fee_rate)
+    orig_md = f"""
+- APG Value: {format_currency(total_contract_value)} × {advance_payment_percent_orig*100:.1f}% = **{format_currency(results["apg_value_orig"])}**  
+- PG Value: {format_currency(total_contract_value)} × {pg_percent_orig*100:.1f}% = **{format_currency(results["pg_value_orig"])}**  
+- APG Duration: {construction_duration_orig} ÷ 12 = **{results["apg_duration_orig"]:.1f} years**  
+- PG Duration: ({construction_duration_orig}+{dlp_duration_orig}) ÷ 12 = **{results["pg_duration_orig"]:.1f} years**  
+- APG Total Cost: {format_currency(results["apg_value_orig"])} × {bank_fee_rate*100:.1f}% × {results["apg_duration_orig"]:.1f} = **{format_currency(results["apg_total_cost_orig"])}**  
+- PG Total Cost: {format_currency(results["pg_value_orig"])} × {bank_fee_rate*100:.1f}% × {results["pg_duration_orig"]:.1f} = **{format_currency(results["pg_total_cost_orig"])}**
+"""
+    phased_md = f"""
+- Phase Contract Value: {format_currency(total_contract_value)} ÷ {num_phases} = **{format_currency(results["phase_contract_value"])}**  
+- APG per Phase: {format_currency(results["phase_contract_value"])} × {advance_payment_percent_orig*100:.1f}% = **{format_currency(results["apg_value_phased"])}**  
+- PG per Phase: {format_currency(results["phase_contract_value"])} × {pg_percent_phased*100:.1f}% = **{format_currency(results["pg_value_phased"])}**  
+- APG Total Cost: {format_currency(results["apg_value_phased"])} × {bank_fee_rate*100:.1f}% × {results["apg_duration_phased"]:.1f} × {num_phases} = **{format_currency(results["apg_total_cost_phased"])}**  
+- PG Total Cost: {format_currency(results["pg_value_phased"])} × {bank_fee_rate*100:.1f}% × {results["pg_duration_phased"]:.1f} × {num_phases} = **{format_currency(results["pg_total_cost_phased"])}**
+"""
+    return orig_md, phased_md
 
 # ======================
 # Page Setup
@@ -26,186 +234,119 @@ st.markdown("Compare costs between original single-project and recommended phase
 # Input Section
 # ======================
 st.header("Project Parameters")
-col1, col2 = st.columns(2)
+with st.form("params"):
+    col1, col2 = st.columns(2)
 
-with col1:
-    st.subheader("Original Structure Parameters")
-    total_contract_value = st.number_input("Total Contract Value ($)", min_value=0.0, value=320_000_000.0, step=1_000_000.0)
-    advance_payment_percent_orig = st.slider("Advance Payment Percentage (%)", 0.0, 100.0, 40.0) / 100
-    pg_percent_orig = st.slider("Performance Guarantee Percentage (%)", 0.0, 100.0, 30.0) / 100
-    construction_duration_orig = st.number_input("Construction Duration (months)", 1, 24)
-    dlp_duration_orig = st.number_input("Defects Liability Period (months)", 0, 12)
+    with col1:
+        st.subheader("Original Structure Parameters")
+        total_contract_value = st.number_input("Total Contract Value ($)", min_value=0.0, value=320_000_000.0, step=1_000_000.0)
+        advance_payment_percent_orig = st.slider("Advance Payment Percentage (%)", 0.0, 100.0, 40.0) / 100
+        pg_percent_orig = st.slider("Performance Guarantee Percentage (%)", 0.0, 100.0, 30.0) / 100
+        construction_duration_orig = st.number_input("Construction Duration (months)", 1, 24)
+        dlp_duration_orig = st.number_input("Defects Liability Period (months)", 0, 12)
 
-with col2:
-    st.subheader("Phased Structure Parameters")
-    num_phases = st.number_input("Number of Phases", 1, 5)
-    pg_percent_phased = st.slider("Phased PG Percentage (%)", 0.0, 100.0, 10.0) / 100
-    construction_duration_phased = st.number_input("Phase Construction Duration (months)", 1, 6)
-    dlp_duration_phased = st.number_input("Phase DLP Duration (months)", 0, 12)
-    bank_fee_rate = st.slider("Bank Fee Rate (% annually)", 0.1, 10.0, 1.0) / 100
+    with col2:
+        st.subheader("Phased Structure Parameters")
+        num_phases = st.number_input("Number of Phases", 1, 5)
+        pg_percent_phased = st.slider("Phased PG Percentage (%)", 0.0, 100.0, 10.0) / 100
+        construction_duration_phased = st.number_input("Phase Construction Duration (months)", 1, 6)
+        dlp_duration_phased = st.number_input("Phase DLP Duration (months)", 0, 12)
+        bank_fee_rate = st.slider("Bank Fee Rate (% annually)", 0.1, 10.0, 1.0) / 100
+
+    st.form_submit_button("Update")
 
 # ======================
 # Calculations
 # ======================
-# Values
-apg_value_orig = total_contract_value * advance_payment_percent_orig
-pg_value_orig = total_contract_value * pg_percent_orig
-
-phase_contract_value = total_contract_value / num_phases
-apg_value_phased = phase_contract_value * advance_payment_percent_orig
-pg_value_phased = phase_contract_value * pg_percent_phased
-
-# Durations (years)
-apg_duration_orig = construction_duration_orig / 12
-pg_duration_orig = (construction_duration_orig + dlp_duration_orig) / 12
-apg_duration_phased = construction_duration_phased / 12
-pg_duration_phased = (construction_duration_phased + dlp_duration_phased) / 12
+inputs = (total_contract_value, advance_payment_percent_orig, pg_percent_orig,
+          construction_duration_orig, dlp_duration_orig, num_phases,
+          pg_percent_phased, construction_duration_phased, dlp_duration_phased,
+          bank_fee_rate)
 
-# Costs
-apg_annual_cost_orig, apg_total_cost_orig = calc_costs(apg_value_orig, bank_fee_rate, apg_duration_orig)
-pg_annual_cost_orig, pg_total_cost_orig = calc_costs(pg_value_orig, bank_fee_rate, pg_duration_orig)
-total_cost_orig = apg_total_cost_orig + pg_total_cost_orig
+# Reruns that don't change the inputs (reconnects, theme changes, fragment
+# reruns) reuse the last results without even hashing into the cache
+if st.session_state.get("last_inputs") != inputs:
+    st.session_state["last_inputs"] = inputs
+    st.session_state["results"] = compute_all(*inputs)
 
-apg_annual_cost_phased, apg_cost_per_phase = calc_costs(apg_value_phased, bank_fee_rate, apg_duration_phased)
-pg_annual_cost_phased, pg_cost_per_phase = calc_costs(pg_value_phased, bank_fee_rate, pg_duration_phased)
-
-apg_total_cost_phased = apg_cost_per_phase * num_phases
-pg_total_cost_phased = pg_cost_per_phase * num_phases
-total_cost_phased = apg_total_cost_phased + pg_total_cost_phased
-
-# Savings
-apg_savings = apg_total_cost_orig - apg_total_cost_phased
-pg_savings = pg_total_cost_orig - pg_total_cost_phased
-total_savings = total_cost_orig - total_cost_phased
-
-# Credit line
-credit_line_orig = apg_value_orig
-credit_line_phased = apg_value_phased + pg_value_phased
-credit_line_savings = credit_line_orig - credit_line_phased
+    # Keep one Metric-indexed summary frame per session and overwrite its
+    # cells in a single block assignment instead of rebuilding it
+    new_summary = st.session_state["results"]["summary_df"]
+    if "summary_df" not in st.session_state:
+        st.session_state["summary_df"] = new_summary.set_index("Metric")
+    else:
+        st.session_state["summary_df"].iloc[:, :] = new_summary.iloc[:, 1:].to_numpy()
+results = st.session_state["results"]
+summary_df = st.session_state["summary_df"]
 
 # ======================
 # Results - Summary Table
 # ======================
 st.header("Results")
-
-summary_data = {
-    "Metric": [
-        "APG Value", 
-        "PG Value", 
-        "APG Duration (years)", 
-        "PG Duration (years)",
-        "APG Annual Cost",
-        "PG Annual Cost",
-        "APG Total Cost",
-        "PG Total Cost",
-        "Total Cost",
-        "Credit Line Required"
-    ],
-    "Original Structure": [
-        format_currency(apg_value_orig),
-        format_currency(pg_value_orig),
-        f"{apg_duration_orig:.1f}",
-        f"{pg_duration_orig:.1f}",
-        format_currency(apg_annual_cost_orig),
-        format_currency(pg_annual_cost_orig),
-        format_currency(apg_total_cost_orig),
-        format_currency(pg_total_cost_orig),
-        format_currency(total_cost_orig),
-        format_currency(credit_line_orig)
-    ],
-    "Phased Structure": [
-        f"{format_currency(apg_value_phased)} per phase",
-        f"{format_currency(pg_value_phased)} per phase",
-        f"{apg_duration_phased:.1f} per phase",
-        f"{pg_duration_phased:.1f} per phase",
-        f"{format_currency(apg_annual_cost_phased)} per phase",
-        f"{format_currency(pg_annual_cost_phased)} per phase",
-        format_currency(apg_total_cost_phased),
-        format_currency(pg_total_cost_phased),
-        format_currency(total_cost_phased),
-        f"{format_currency(credit_line_phased)} at any time"
-    ],
-    "Savings/Improvement": [
-        "", "", "", "", "", "",
-        format_currency(apg_savings),
-        format_currency(pg_savings),
-        format_currency(total_savings),
-        f"{format_currency(credit_line_savings)} freed"
-    ]
-}
-
-summary_df = pd.DataFrame(summary_data)
-st.dataframe(summary_df, use_container_width=True, hide_index=True)
+st.table(summary_df)
 
 # ======================
 # Charts
 # ======================
-# Cost comparison
-cost_df = pd.DataFrame({
-    "Cost Type": ["APG", "PG", "Total"],
-    "Original Structure": [apg_total_cost_orig, pg_total_cost_orig, total_cost_orig],
-    "Phased Structure": [apg_total_cost_phased, pg_total_cost_phased, total_cost_phased]
-})
-fig = px.bar(cost_df.melt(id_vars="Cost Type", var_name="Structure", value_name="Cost"),
-             x="Cost Type", y="Cost", color="Structure", barmode="group",
-             title="Cost Comparison: Original vs Phased")
-st.plotly_chart(fig, use_container_width=True)
-
-# Savings chart
-savings_df = pd.DataFrame({
-    "Savings Type": ["APG Savings", "PG Savings", "Total Savings"],
-    "Amount": [apg_savings, pg_savings, total_savings]
-})
-fig2 = px.bar(savings_df, x="Savings Type", y="Amount", title="Savings from Phased Structure")
-st.plotly_chart(fig2, use_container_width=True)
-
-# Credit line
-credit_df = pd.DataFrame({
-    "Structure": ["Original", "Phased"],
-    "Credit Line Required": [credit_line_orig, credit_line_phased]
-})
-fig3 = px.bar(credit_df, x="Structure", y="Credit Line Required", title="Credit Line Requirements")
-st.plotly_chart(fig3, use_container_width=True)
+@st.fragment
+def render_charts(cost_values, savings_values, credit_values):
+    """Render the comparison charts from plain value tuples."""
+    st.plotly_chart(pio.from_json(comparison_fig_json(cost_values, savings_values, credit_values)),
+                    use_container_width=True)
+
+render_charts(
+    (results["apg_total_cost_orig"], results["pg_total_cost_orig"], results["total_cost_orig"],
+     results["apg_total_cost_phased"], results["pg_total_cost_phased"], results["total_cost_phased"]),
+    (results["apg_savings"], results["pg_savings"], results["total_savings"]),
+    (results["credit_line_orig"], results["credit_line_phased"]),
+)
+
+# ======================
+# Bank Fee Rate Sweep
+# ======================
+with st.expander("Sweep bank fee rate"):
+    sweep_fig = pio.from_json(rate_sweep_fig_json(
+        results["apg_value_orig"], results["pg_value_orig"], total_contract_value * pg_percent_phased,
+        results["apg_duration_orig"], results["pg_duration_orig"],
+        results["apg_duration_phased"], results["pg_duration_phased"]))
+    st.plotly_chart(sweep_fig, use_container_width=True)
 
 # ======================
 # Detailed Calculations
 # ======================
-st.header("Detailed Calculations")
-col3, col4 = st.columns(2)
-
-with col3:
-    st.subheader("Original Structure")
-    st.markdown(f"""
-- APG Value: {format_currency(total_contract_value)} × {advance_payment_percent_orig*100:.1f}% = **{format_currency(apg_value_orig)}**  
-- PG Value: {format_currency(total_contract_value)} × {pg_percent_orig*100:.1f}% = **{format_currency(pg_value_orig)}**  
-- APG Duration: {construction_duration_orig} ÷ 12 = **{apg_duration_orig:.1f} years**  
-- PG Duration: ({construction_duration_orig}+{dlp_duration_orig}) ÷ 12 = **{pg_duration_orig:.1f} years**  
-- APG Total Cost: {format_currency(apg_value_orig)} × {bank_fee_rate*100:.1f}% × {apg_duration_orig:.1f} = **{format_currency(apg_total_cost_orig)}**  
-- PG Total Cost: {format_currency(pg_value_orig)} × {bank_fee_rate*100:.1f}% × {pg_duration_orig:.1f} = **{format_currency(pg_total_cost_orig)}**
-""")
+@st.fragment
+def render_details(*inputs):
+    """Render the step-by-step working for both structures."""
+    orig_md, phased_md = build_detail_markdown(*inputs)
+    st.header("Detailed Calculations")
+    col3, col4 = st.columns(2)
 
-with col4:
-    st.subheader("Phased Structure")
-    st.markdown(f"""
-- Phase Contract Value: {format_currency(total_contract_value)} ÷ {num_phases} = **{format_currency(phase_contract_value)}**  
-- APG per Phase: {format_currency(phase_contract_value)} × {advance_payment_percent_orig*100:.1f}% = **{format_currency(apg_value_phased)}**  
-- PG per Phase: {format_currency(phase_contract_value)} × {pg_percent_phased*100:.1f}% = **{format_currency(pg_value_phased)}**  
-- APG Total Cost: {format_currency(apg_value_phased)} × {bank_fee_rate*100:.1f}% × {apg_duration_phased:.1f} × {num_phases} = **{format_currency(apg_total_cost_phased)}**  
-- PG Total Cost: {format_currency(pg_value_phased)} × {bank_fee_rate*100:.1f}% × {pg_duration_phased:.1f} × {num_phases} = **{format_currency(pg_total_cost_phased)}**
-""")
+    with col3:
+        st.subheader("Original Structure")
+        st.markdown(orig_md)
+
+    with col4:
+        st.subheader("Phased Structure")
+        st.markdown(phased_md)
+
+render_details(*inputs)
 
 # ======================
 # Conclusion
 # ======================
 st.header("Conclusion")
 st.success(f"""
-**Direct Cost Savings: {format_currency(total_savings)}**  
-**Credit Line Reduction: {format_currency(credit_line_savings)}** (from {format_currency(credit_line_orig)} to {format_currency(credit_line_phased)})  
-**Improved cash flow** by requiring only {format_currency(credit_line_phased)} at any time instead of {format_currency(credit_line_orig)}
+**Direct Cost Savings: {format_currency(results["total_savings"])}**  
+**Credit Line Reduction: {format_currency(results["credit_line_savings"])}** (from {format_currency(results["credit_line_orig"])} to {format_currency(results["credit_line_phased"])})  
+**Improved cash flow** by requiring only {format_currency(results["credit_line_phased"])} at any time instead of {format_currency(results["credit_line_orig"])}
 """)
 
 # ======================
 # Download CSV
 # ======================
-csv = summary_df.to_csv(index=False).encode('utf-8')
-st.download_button("Download Results as CSV", csv, "guarantee_cost_calculator_results.csv", "text/csv")
+# Stateful expander: the CSV is only encoded while the panel is open
+download_panel = st.expander("Download results", on_change="rerun", key="download_open")
+with download_panel:
+    if download_panel.open:
+        csv = build_csv(summary_df)
+        st.download_button("Download Results as CSV", csv, "guarantee_cost_calculator_results.csv", "text/csv")